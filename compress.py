@@ -1,9 +1,13 @@
 import math
-import re
 import shutil
 import sys
 import os
+import io
+import json
 import subprocess
+from contextlib import redirect_stdout
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+from functools import lru_cache
 from pathlib import Path
 from enum import Enum
 from abc import ABC, abstractmethod
@@ -19,7 +23,7 @@ try:
 except ImportError:
     failed_imports.append("tqdm")
 try:
-    from PIL import Image
+    from PIL import Image, ImageOps
 except ImportError:
     failed_imports.append("Pillow")
 try:
@@ -31,12 +35,97 @@ try:
 except ImportError:
     failed_imports.append("rawpy")
 
+# Optional lossless optimizers, images are still compressed by ffmpeg alone without them
+try:
+    import mozjpeg_lossless_optimization
+except ImportError:
+    mozjpeg_lossless_optimization = None
+try:
+    import oxipng
+except ImportError:
+    oxipng = None
+try:
+    from turbojpeg import TurboJPEG, TJPF_RGB, TJSAMP_420, TJFLAG_PROGRESSIVE
+except ImportError:
+    TurboJPEG = None
+
 if failed_imports:
     print("Failed importing dependencies, please try re-installing them using the following command and then try again:")
     print(f"\t{sys.executable} -m pip install", *failed_imports)
     exit()
 
 
+# x264 stops scaling well past ~4 threads per stream, so several narrower
+# concurrent jobs beat one wide one when compressing a folder.
+THREADS_PER_JOB = 4
+# Upper bound on threads handed to a single x264 encode; beyond this the
+# extra threads mostly add synchronization overhead.
+MAX_THREADS_PER_STREAM = 8
+# Concurrent encodes when a hardware encoder is used: they all share one
+# encoder chip, and consumer cards limit how many sessions can be open at once
+MAX_HARDWARE_JOBS = 2
+# Prefix of the progress line ffmpeg writes to stdout under `-progress pipe:1`
+PROGRESS_KEY = b"out_time_ms="
+# Extensions (lowercase, without the dot) picked up when compressing a folder
+VIDEO_EXTENSIONS = frozenset({"mp4", "avi", "mov", "mkv"})
+IMAGE_EXTENSIONS = frozenset({"jpg", "jpeg", "png", "tiff", "cr2"})
+APPROVED_EXTENSIONS = VIDEO_EXTENSIONS | IMAGE_EXTENSIONS
+
+
+def _latest_progress_seconds(buffer: bytearray) -> Optional[int]:
+    """
+    Returns the newest whole second reported by a complete `out_time_ms=` line in
+    `buffer`, or None if it holds none with a numeric value. Complete lines are
+    consumed from `buffer`, a trailing partial line is kept for the next chunk.
+    """
+    end = buffer.rfind(b"\n")
+    if end == -1:
+        return None
+    seconds = None
+    start = buffer.rfind(PROGRESS_KEY, 0, end)
+    if start != -1:
+        # out_time_ms is reported in microseconds despite its name
+        value = buffer[start + len(PROGRESS_KEY):buffer.find(b"\n", start)].strip()
+        if value.isdigit():
+            seconds = int(value) // 1_000_000
+    del buffer[:end + 1]
+    return seconds
+
+
+def _partial_path(dst: str) -> str:
+    """
+    Returns the temporary path ffmpeg writes `dst` to, keeping the extension
+    so ffmpeg still infers the right format. It replaces `dst` only on success,
+    so a failed run never destroys a previous good output.
+    """
+    root, ext = os.path.splitext(dst)
+    return f"{root}.partial{ext}"
+
+
+def _remove_partials(*paths: str) -> None:
+    for path in paths:
+        if os.path.exists(path):
+            os.remove(path)
+
+
+def _has_approved_extension(name: str) -> bool:
+    # A real extension needs both a stem and a dot, so neither `mp4` nor `.jpg` counts
+    head, sep, ext = name.rpartition('.')
+    return bool(sep and head) and ext.lower() in APPROVED_EXTENSIONS
+
+
+def _compress_file(file_compressor: 'FileCompressor', src: str, dst: str, preset: 'FFMPEGCompressionPreset', kwargs: dict) -> str:
+    """
+    Module level so it can be pickled and dispatched to a worker process.
+    Returns everything the compressor logged, so the parent can write it above
+    its progress bar instead of the worker printing over it.
+    """
+    output = io.StringIO()
+    with redirect_stdout(output):
+        file_compressor.compress(src, dst, preset, **kwargs)
+    return output.getvalue()
+
+
 class FFMPEGCompressionPreset(Enum):
     ULTRAFAST = "ultrafast"
     SUPERFAST = "superfast"
@@ -51,16 +140,180 @@ class FFMPEGCompressionPreset(Enum):
 
     @classmethod
     def from_string(cls, s: str) -> 'FFMPEGCompressionPreset':
-        for p in FFMPEGCompressionPreset:
-            if p.value == s:
-                return p
-        raise ValueError
+        try:
+            return cls(s)
+        except ValueError:
+            raise ValueError(
+                f"unknown preset {s!r}, expected one of {[p.value for p in cls]}") from None
+
+
+# `faster` costs roughly 40% of the CPU time of `medium` (x264 preset curve:
+# faster ~1.01 vs medium ~1.76) for a barely visible quality loss at CRF 23.
+DEFAULT_PRESET = FFMPEGCompressionPreset.FASTER
+
+
+class FFMPEGTune(Enum):
+    FILM = "film"
+    ANIMATION = "animation"
+    GRAIN = "grain"
+    STILLIMAGE = "stillimage"
+    FASTDECODE = "fastdecode"
+    ZEROLATENCY = "zerolatency"
+    PSNR = "psnr"
+    SSIM = "ssim"
+
+    @classmethod
+    def from_string(cls, s: str) -> 'FFMPEGTune':
+        try:
+            return cls(s)
+        except ValueError:
+            raise ValueError(
+                f"unknown tune {s!r}, expected one of {[t.value for t in cls]}") from None
 
 
 class ImageCompressionPreset(Enum):
     LOW = "low"
 
 
+# Presets for which RAW files are developed at half resolution
+LOW_QUALITY_PRESETS = frozenset({
+    ImageCompressionPreset.LOW,
+    FFMPEGCompressionPreset.ULTRAFAST,
+    FFMPEGCompressionPreset.SUPERFAST,
+    FFMPEGCompressionPreset.VERYFAST,
+})
+EXIF_ORIENTATION = 0x0112
+# Formats that are written out in a different format than they are read in
+OUTPUT_EXTENSIONS: Dict[str, str] = {
+    ".cr2": ".jpg",
+}
+
+
+# "auto" picks the first working hardware encoder, "none" always uses libx264
+HWACCEL_MODES: Tuple[str, ...] = ("auto", "none")
+# Hardware H.264 encoders in order of preference, libx264 is the fallback
+HARDWARE_ENCODERS: Tuple[str, ...] = (
+    "h264_nvenc", "h264_qsv", "h264_videotoolbox", "h264_amf"
+)
+NVENC_PRESETS: Dict[FFMPEGCompressionPreset, str] = {
+    FFMPEGCompressionPreset.ULTRAFAST: "p1",
+    FFMPEGCompressionPreset.SUPERFAST: "p1",
+    FFMPEGCompressionPreset.VERYFAST: "p2",
+    FFMPEGCompressionPreset.FASTER: "p3",
+    FFMPEGCompressionPreset.FAST: "p4",
+    FFMPEGCompressionPreset.MEDIUM: "p4",
+    FFMPEGCompressionPreset.SLOW: "p5",
+    FFMPEGCompressionPreset.SLOWER: "p6",
+    FFMPEGCompressionPreset.VERYSLOW: "p7",
+    FFMPEGCompressionPreset.PLACEBO: "p7",
+}
+# h264_qsv only knows veryfast..veryslow, the outer x264 presets are clamped
+QSV_PRESETS: Dict[FFMPEGCompressionPreset, str] = {
+    FFMPEGCompressionPreset.ULTRAFAST: "veryfast",
+    FFMPEGCompressionPreset.SUPERFAST: "veryfast",
+    FFMPEGCompressionPreset.VERYFAST: "veryfast",
+    FFMPEGCompressionPreset.FASTER: "faster",
+    FFMPEGCompressionPreset.FAST: "fast",
+    FFMPEGCompressionPreset.MEDIUM: "medium",
+    FFMPEGCompressionPreset.SLOW: "slow",
+    FFMPEGCompressionPreset.SLOWER: "slower",
+    FFMPEGCompressionPreset.VERYSLOW: "veryslow",
+    FFMPEGCompressionPreset.PLACEBO: "veryslow",
+}
+
+
+@lru_cache(maxsize=None)
+def _available_encoders() -> Set[str]:
+    """
+    Returns the names of the encoders compiled into the local ffmpeg binary.
+    """
+    try:
+        output = subprocess.run(["ffmpeg", "-hide_banner", "-encoders"],
+                                capture_output=True, text=True, close_fds=False).stdout
+    except OSError:
+        return set()
+    return _parse_encoders(output)
+
+
+def _parse_encoders(output: str) -> Set[str]:
+    """
+    Extracts the encoder names from the output of `ffmpeg -encoders`.
+    """
+    encoders = set()
+    for line in output.splitlines():
+        parts = line.split()
+        # encoder rows look like " V....D libx264  libx264 H.264 ...",
+        # the legend above them like " V..... = Video"
+        if len(parts) >= 2 and len(parts[0]) == 6 and parts[0][0] in "VAS" and parts[1] != "=":
+            encoders.add(parts[1])
+    return encoders
+
+
+def _encoder_kwargs(vcodec: str, preset: FFMPEGCompressionPreset, crf: int, threads: int, tune: Optional[FFMPEGTune]) -> dict:
+    """
+    Returns the rate control and speed options `vcodec` is run with.
+    """
+    if vcodec == "h264_nvenc":
+        # without b:v 0 the quality target is still capped by NVENC's default 2M bitrate
+        return dict(preset=NVENC_PRESETS[preset], rc="vbr", cq=crf, **{"b:v": 0})
+    if vcodec == "h264_qsv":
+        return dict(preset=QSV_PRESETS[preset], global_quality=crf)
+    if vcodec == "h264_videotoolbox":
+        return {"q:v": 65}
+    if vcodec == "h264_amf":
+        return dict(rc="cqp", qp_i=crf, qp_p=crf)
+    if vcodec == "copy":
+        return {}
+    kwargs = dict(crf=crf, preset=preset.value, threads=threads,
+                  **{"x264-params": "aq-mode=3"})
+    if tune:
+        kwargs["tune"] = tune.value
+    return kwargs
+
+
+@lru_cache(maxsize=None)
+def _hardware_encoder() -> Optional[str]:
+    """
+    Returns the first hardware encoder that can actually encode a frame on this machine.
+    ffmpeg builds often list encoders whose device is missing, or that reject options
+    their hardware or driver doesn't support, so each candidate is verified with a
+    one frame test encode using the same options as a real encode.
+    """
+    available = _available_encoders()
+    for encoder in HARDWARE_ENCODERS:
+        if encoder not in available:
+            continue
+        command: List[str] = (
+            ffmpeg
+            .input("color=size=256x256", f="lavfi")
+            .output("-", f="null", vcodec=encoder, **{"frames:v": 1},
+                    **_encoder_kwargs(encoder, DEFAULT_PRESET, 23, 1, None))
+            .global_args("-hide_banner", "-loglevel", "error", "-nostdin")
+            .compile()
+        )
+        test = subprocess.run(command, stdin=subprocess.DEVNULL, stdout=subprocess.DEVNULL,
+                              stderr=subprocess.DEVNULL, close_fds=False)
+        if test.returncode == 0:
+            return encoder
+    return None
+
+
+def _check_hwaccel(hwaccel: str) -> None:
+    if hwaccel not in HWACCEL_MODES:
+        raise ValueError(
+            f"unknown hwaccel {hwaccel!r}, expected one of {list(HWACCEL_MODES)}")
+
+
+def _select_vcodec(hwaccel: str) -> str:
+    """
+    Returns the H.264 encoder to use for `hwaccel` ("auto" or "none").
+    """
+    _check_hwaccel(hwaccel)
+    if hwaccel == "auto":
+        return _hardware_encoder() or "libx264"
+    return "libx264"
+
+
 class Compressor(ABC):
 
     @abstractmethod
@@ -68,61 +321,132 @@ class Compressor(ABC):
                  overwrite: bool = False, cpu_utilization: float = 0.8, **kwargs) -> None: ...
 
 
+def _output_names(files: Iterable[str]) -> Dict[str, str]:
+    """
+    Maps every input file name to the name of its output. Names are compared
+    case-insensitively, as they are on Windows and macOS. A converted file whose
+    output would collide with another one (an `a.cr2` next to an `a.jpg` from the
+    same RAW+JPEG shot) keeps its original extension, `a.cr2.jpg`. Any other
+    collision is skipped with a warning instead of two jobs writing the same file.
+    """
+    names: Dict[str, str] = {}
+    taken: Set[str] = set()
+    # files that keep their format claim their names first, converted ones adapt
+    for file in sorted(files, key=lambda f: os.path.splitext(f)[1].lower() in OUTPUT_EXTENSIONS):
+        name, ext = os.path.splitext(file)
+        output_ext = OUTPUT_EXTENSIONS.get(ext.lower())
+        output = f"{name}{output_ext or ext}"
+        if output.lower() in taken and output_ext:
+            output = f"{file}{output_ext}"
+        if output.lower() in taken:
+            print(f"Skipping {file}, its output {output} collides with another file's")
+            continue
+        taken.add(output.lower())
+        names[file] = output
+    return names
+
+
 class FolderCompressor(Compressor):
     def __init__(self, file_compressor: 'FileCompressor'):
         self.file_compressor = file_compressor
 
     def compress(self, src: str, dst: str, preset: str, *,
-                 overwrite: bool = False, utilization: float = 0.8) -> None:
-        APPROVED_EXTENSIONS = {
-            ".mp4", ".avi", ".mov", ".mkv", ".jpg", ".jpeg", ".png", ".tiff", ".cr2"
-        }
-        if overwrite:
+                 overwrite: bool = False, utilization: float = 0.8, concurrency: Optional[int] = None,
+                 clean: bool = False, **kwargs) -> None:
+        if clean:
             if os.path.exists(dst):
                 shutil.rmtree(dst)
         os.makedirs(dst, exist_ok=True)
-        for parentdir, subdirs, files in os.walk(src):
-            files = list(filter(lambda f: os.path.splitext(f)
-                         [1] in APPROVED_EXTENSIONS, files))
-            break
+        with os.scandir(src) as it:
+            files = [entry.name for entry in it
+                     if entry.is_file(follow_symlinks=False) and _has_approved_extension(entry.name)]
         if not files:
             print(
-                "No applicable files found. try files with the following extensions:", APPROVED_EXTENSIONS)
+                "No applicable files found. try files with the following extensions:", sorted(APPROVED_EXTENSIONS))
             exit()
-        for file in (pbar := tqdm(files, total=len(files), position=0, desc=f"Files in {src}")):
-            name, ext = os.path.splitext(file)
+        available_threads = max(1, math.floor(os.cpu_count()*utilization))
+
+        image_jobs: List[Tuple[str, str]] = []
+        video_jobs: List[Tuple[str, str]] = []
+        for file, output in _output_names(files).items():
             updated_src = os.path.join(src, file)
-            updated_dst = os.path.join(dst, f"{name}{ext}")
-            if os.path.exists(dst) and not overwrite:
+            jobs = image_jobs if os.path.splitext(file)[1][1:].lower() in IMAGE_EXTENSIONS else video_jobs
+            updated_dst = os.path.join(dst, output)
+            # existing outputs are replaced by the file compressors once the new one is written
+            if os.path.exists(updated_dst) and not overwrite:
                 continue
-            self.file_compressor.compress(updated_src, updated_dst,
-                                          preset, overwrite=overwrite, prev_pbar=pbar, utilization=utilization)
+            jobs.append((updated_src, updated_dst))
+
+        if video_jobs and "vcodec" not in kwargs:
+            # Detected once here instead of in every worker process
+            kwargs["vcodec"] = _select_vcodec(kwargs.get("hwaccel", "auto"))
+        if concurrency is None:
+            concurrency = max(1, available_threads // THREADS_PER_JOB)
+        if kwargs.get("vcodec") in HARDWARE_ENCODERS:
+            concurrency = min(concurrency, MAX_HARDWARE_JOBS)
+        concurrency = max(1, min(concurrency, len(video_jobs)))
+        threads_per_job = max(1, available_threads // concurrency)
+
+        with tqdm(total=len(image_jobs) + len(video_jobs), position=0, desc=f"Files in {src}") as pbar:
+            # Images are short and mostly spent in I/O or in C code that releases
+            # the GIL, so a thread per core with a single ffmpeg thread each is enough
+            with ThreadPoolExecutor(max_workers=available_threads) as executor:
+                futures = [
+                    executor.submit(self.file_compressor.compress, updated_src, updated_dst, preset,
+                                    overwrite=overwrite, prev_pbar=pbar, threads=1, **kwargs)
+                    for updated_src, updated_dst in image_jobs
+                ]
+                for future in as_completed(futures):
+                    future.result()
+                    pbar.update()
+
+            if concurrency == 1:
+                for updated_src, updated_dst in video_jobs:
+                    self.file_compressor.compress(updated_src, updated_dst, preset, overwrite=overwrite,
+                                                  prev_pbar=pbar, threads=threads_per_job, **kwargs)
+                    pbar.update()
+                return
+
+            # Workers can't share the parent's bar, and their own bars would all
+            # redraw the line the parent's bar is on
+            video_kwargs = dict(overwrite=overwrite, threads=threads_per_job,
+                                show_progress=False, **kwargs)
+            with ProcessPoolExecutor(max_workers=concurrency) as executor:
+                futures = [
+                    executor.submit(_compress_file, self.file_compressor,
+                                    updated_src, updated_dst, preset, video_kwargs)
+                    for updated_src, updated_dst in video_jobs
+                ]
+                for future in as_completed(futures):
+                    message = future.result().rstrip("\n")
+                    if message:
+                        pbar.write(message)
+                    pbar.update()
 
 
 class FileCompressor(Compressor):
     @abstractmethod
     def compress(self, src, dst, preset, *, overwrite=False,
-                 prev_pbar: Optional[tqdm] = None, utilization=0.8): ...
+                 prev_pbar: Optional[tqdm] = None, utilization=0.8, threads: Optional[int] = None, **kwargs): ...
 
 
 class SwitchCompressor(FileCompressor):
     def __init__(self, mapping: Dict[Tuple[str, ...], FileCompressor], default: Optional[FileCompressor] = None):
         self.mapping = mapping
         self.default = default
+        # flattened once so dispatching a file is a single dict lookup
+        self._compressors: Dict[str, FileCompressor] = {
+            ext.lower(): compressor for extensions, compressor in mapping.items() for ext in extensions
+        }
+        self._all_extensions = frozenset(self._compressors)
 
     def compress(self, src: str, *args, **kwargs):
         _, ext = os.path.splitext(src)
-        all_extensions = set()
-        for extensions, compressor in self.mapping.items():
-            all_extensions.update(extensions)
-            if ext in extensions:
-                compressor.compress(src, *args, **kwargs)
-                break
-        else:
-            if not self.default:
-                print(f"Invalid extension '{ext}' not in {all_extensions}")
-            else:
-                self.default.compress(src, *args, **kwargs)
+        compressor = self._compressors.get(ext.lower(), self.default)
+        if compressor is None:
+            print(f"Invalid extension '{ext}' not in {set(self._all_extensions)}")
+            return
+        compressor.compress(src, *args, **kwargs)
 
 
 class ObjectCompressor(Compressor):
@@ -133,27 +457,41 @@ class ObjectCompressor(Compressor):
     def _is_folder(self, s: str) -> bool:
         return os.path.splitext(s)[1] == ''
 
-    def compress(self, src: str, dst: str, preset: str, *,
-                 overwrite: bool = False, utilization: float = 0.8):
+    def compress(self, src: str, dst: str, preset: Optional[str] = None, *,
+                 overwrite: bool = False, utilization: float = 0.8, concurrency: Optional[int] = None,
+                 tune: Optional[str] = None, hwaccel: str = "auto", max_image_size: Optional[int] = None,
+                 stream_copy: bool = False, clean: bool = False):
         utilization = max(0.1, min(utilization, 1.0))
-        src = str(Path(src).resolve().absolute())
-        dst = str(Path(dst).resolve().absolute())
+        _check_hwaccel(hwaccel)
+        ffmpeg_preset = FFMPEGCompressionPreset.from_string(
+            preset) if preset else DEFAULT_PRESET
+        file_kwargs = dict(
+            tune=FFMPEGTune.from_string(tune) if tune else None,
+            hwaccel=hwaccel,
+            max_image_size=max_image_size,
+            stream_copy=stream_copy,
+        )
+        # resolve() already returns an absolute path, and is done once per run
+        dst_path = Path(dst).resolve()
+        src = str(Path(src).resolve())
+        dst = str(dst_path)
         explorer_target = dst
         if not self._is_folder(src):
             if self._is_folder(dst):
                 print(
                     "'src' is a file while 'dst' is a folder. Aborting.")
                 exit()
-            explorer_target = str(Path(dst).resolve().absolute().parent)
+            explorer_target = str(dst_path.parent)
             self.file_compressor.compress(
-                src, dst, preset, overwrite=overwrite, utilization=utilization)
+                src, dst, ffmpeg_preset, overwrite=overwrite, utilization=utilization, **file_kwargs)
         else:
             if not self._is_folder(dst):
                 print(
                     "'src' is a folder while 'dst' is a file. Aborting.")
                 exit()
             self.folder_compressor.compress(
-                src, dst, FFMPEGCompressionPreset.from_string(preset), overwrite=overwrite, utilization=utilization)
+                src, dst, ffmpeg_preset, overwrite=overwrite, utilization=utilization,
+                concurrency=concurrency, clean=clean, **file_kwargs)
 
         cmd = "open"
         if sys.platform == "win32":
@@ -170,103 +508,350 @@ class ImageCompressor(FileCompressor):
 
 
 class FFMPEGImageCompressor(ImageCompressor):
-    def compress(self, src: str, dst: str, preset: FFMPEGCompressionPreset, *, overwrite: bool = False, prev_pbar: Optional[tqdm] = None, utilization: float = 1.0):
+    def _save_jpeg(self, image: 'Image.Image', dst: str) -> None:
+        buffer = io.BytesIO()
+        image.save(buffer, "JPEG", quality=85,
+                   optimize=True, progressive=True, subsampling="4:2:0")
+        data = buffer.getvalue()
+        if mozjpeg_lossless_optimization:
+            data = mozjpeg_lossless_optimization.optimize(data)
+        Path(dst).write_bytes(data)
+
+    def _compress_raw(self, src: str, dst: str, preset: FFMPEGCompressionPreset, max_image_size: Optional[int] = None) -> None:
+        # half_size uses every 2x2 Bayer block as one pixel instead of
+        # interpolating, roughly a quarter of the demosaic work.
+        # libraw already rotates the result to the camera's orientation.
+        with rawpy.imread(src) as raw:
+            rgb = raw.postprocess(half_size=preset in LOW_QUALITY_PRESETS,
+                                  use_camera_wb=True, output_bps=8)
+        image = Image.fromarray(rgb)
+        if max_image_size:
+            image.thumbnail((max_image_size, max_image_size), Image.LANCZOS)
+        self._save_jpeg(image, dst)
+
+    def _downscale_jpeg(self, src: str, dst: str, max_image_size: int) -> bool:
+        """
+        Downscales a JPEG so its longest edge is at most `max_image_size` pixels.
+        Returns False without writing anything if the image is already small enough.
+        """
+        with Image.open(src) as image:
+            scale = max_image_size / max(image.size)
+            if scale >= 1:
+                return False
+            target_size = (max(1, round(image.width * scale)),
+                           max(1, round(image.height * scale)))
+            # draft makes libjpeg decode at 1/2, 1/4 or 1/8 size, skipping most of the IDCT
+            image.draft("RGB", target_size)
+            # the output carries no EXIF, so the orientation is applied to the pixels
+            upright = ImageOps.exif_transpose(image)
+            upright.thumbnail((max_image_size, max_image_size), Image.LANCZOS)
+            self._save_jpeg(upright, dst)
+        return True
+
+    def _recompress_jpeg(self, src: str, dst: str) -> bool:
+        """
+        Re-encodes a JPEG with libjpeg-turbo, whose SIMD color conversion and
+        DCT paths are about twice as fast as ffmpeg's encoder.
+        Returns False without writing anything if libjpeg-turbo isn't available
+        and the photo needs no rotation.
+        """
+        with Image.open(src) as image:
+            # Neither libjpeg-turbo nor ffmpeg apply the EXIF orientation, and the
+            # output carries no EXIF, so rotated photos go through Pillow
+            if image.getexif().get(EXIF_ORIENTATION, 1) != 1:
+                self._save_jpeg(ImageOps.exif_transpose(image), dst)
+                return True
+        tj = _turbo_jpeg()
+        if tj is None:
+            return False
+        rgb = tj.decode(Path(src).read_bytes(), pixel_format=TJPF_RGB)
+        data = tj.encode(rgb, quality=85, pixel_format=TJPF_RGB,
+                         jpeg_subsample=TJSAMP_420, flags=TJFLAG_PROGRESSIVE)
+        if mozjpeg_lossless_optimization:
+            data = mozjpeg_lossless_optimization.optimize(data)
+        Path(dst).write_bytes(data)
+        return True
+
+    def compress(self, src: str, dst: str, preset: FFMPEGCompressionPreset, *, overwrite: bool = False, prev_pbar: Optional[tqdm] = None, utilization: float = 1.0, threads: Optional[int] = None, max_image_size: Optional[int] = None, **kwargs):
         """
         Compresses an image losslessly or lossy using ffmpeg, Pillow (based on the file type), or rawpy (for CR2 files).
 
         :param input_path: Path to the input image file.
         :param output_path: Path to save the compressed image.
         :param preset: Compression preset for image compression.
+        :param max_image_size: Optional limit in pixels for the longest edge of the output.
         """
         log = print
         if prev_pbar:
             log = prev_pbar.write
 
+        if os.path.exists(dst) and not overwrite:
+            log(f"{dst} already exists, pass --overwrite to replace it")
+            return
+
         input_ext = os.path.splitext(src)[1].lower()
-        extra_kwargs = []
+        extra_kwargs = {}
         if input_ext in [".jpg", ".jpeg"]:
             extra_kwargs = {"qscale:v": "2"}  # Adjust quality for JPEG
         elif input_ext == ".png":
             # Adjust compression level for PNG
             extra_kwargs = {"compression_level": "10"}
 
+        partial = _partial_path(dst)
         try:
+            if input_ext == ".cr2":
+                self._compress_raw(src, dst, preset, max_image_size)
+                return
+            if input_ext in [".jpg", ".jpeg"]:
+                if max_image_size and self._downscale_jpeg(src, dst, max_image_size):
+                    return
+                if self._recompress_jpeg(src, dst):
+                    return
+            if input_ext == ".png" and oxipng and not max_image_size:
+                # oxipng is lossless and beats ffmpeg's zlib encoder on both size and speed
+                oxipng.optimize(src, dst, level=2,
+                                strip=oxipng.StripChunks.safe())
+                return
+            # Every transform is fused into a single filter chain, so the image
+            # is decoded, filtered and encoded in one pass
+            vf_chain = ",".join(filter(None, [
+                f"scale='min({max_image_size},iw)':'min({max_image_size},ih)':force_original_aspect_ratio=decrease"
+                if max_image_size else None,
+                "format=yuvj420p"
+                if preset in LOW_QUALITY_PRESETS and input_ext in [".jpg", ".jpeg"] else None,
+            ]))
+            if vf_chain:
+                extra_kwargs["vf"] = vf_chain
             command: List[str] = (
                 ffmpeg
                 .input(src)
                 .output(
-                    dst,
+                    partial,
                     preset=preset.value,
-                    threads=max(1, math.floor(os.cpu_count()*utilization)),
+                    threads=threads or max(1, math.floor(os.cpu_count()*utilization)),
+                    map_metadata=-1,
                     **extra_kwargs
                 )
+                .global_args("-nostdin")
+                .overwrite_output()
                 .compile()
             )
             # Run FFmpeg with progress monitoring
             process = subprocess.Popen(
-                command, stderr=subprocess.PIPE, universal_newlines=True)
+                command, stdin=subprocess.DEVNULL, stderr=subprocess.DEVNULL, close_fds=False)
             process.wait()
+            if process.returncode != 0:
+                cmd = " ".join(command)
+                log(
+                    f"[ERROR] Failed processing {src}. Try running manually with:\n\t{cmd}")
+                return
+            os.replace(partial, dst)
+            if input_ext in [".jpg", ".jpeg"] and mozjpeg_lossless_optimization:
+                # Lossless pass: mozjpeg rewrites the entropy coding, the pixels are untouched
+                output = Path(dst)
+                output.write_bytes(
+                    mozjpeg_lossless_optimization.optimize(output.read_bytes()))
+            if input_ext == ".png" and oxipng:
+                oxipng.optimize(dst, level=2, strip=oxipng.StripChunks.safe())
         except ffmpeg.Error as e:
             log(f"Error during compression: {e.stderr.decode()}")
 
         except Exception as e:
             log(f"An error occurred: {e}")
 
+        finally:
+            _remove_partials(partial)
+
+
+@lru_cache(maxsize=None)
+def _turbo_jpeg() -> Optional['TurboJPEG']:
+    """
+    Returns a shared TurboJPEG handle, or None if PyTurboJPEG or libturbojpeg is missing.
+    """
+    if TurboJPEG is None:
+        return None
+    try:
+        return TurboJPEG()
+    except (OSError, RuntimeError):
+        return None
+
+
+PROBE_COMMAND: Tuple[str, ...] = (
+    "ffprobe", "-v", "error",
+    "-show_entries", "format=duration:stream=codec_type,codec_name",
+    "-of", "json",
+)
+
+
+@lru_cache(maxsize=None)
+def _probe(path: str) -> Tuple[Optional[float], Optional[str], Optional[str]]:
+    """
+    Returns the duration in seconds and the codecs of the first video and audio streams
+    of a media file, each None if ffprobe can't tell. Only these fields are queried,
+    so ffprobe doesn't have to dump every stream.
+    """
+    try:
+        output = subprocess.run([*PROBE_COMMAND, path],
+                                capture_output=True, text=True, close_fds=False).stdout
+        info = json.loads(output)
+    except (OSError, ValueError):
+        return None, None, None
+    codecs: Dict[str, str] = {}
+    for stream in info.get("streams", []):
+        codecs.setdefault(stream.get("codec_type"), stream.get("codec_name"))
+    try:
+        duration = float(info["format"]["duration"])
+    except (KeyError, ValueError):
+        duration = None
+    return duration, codecs.get("video"), codecs.get("audio")
+
+
+# Containers with a moov atom that +faststart can move to the front
+FASTSTART_EXTENSIONS = frozenset({".mp4", ".mov"})
+# (dst, vcodec, crf, preset) of one output produced from a shared input
+VideoTarget = Tuple[str, str, int, FFMPEGCompressionPreset]
+
 
 class FFMPEGVideoCompressor(VideoCompressor):
-    def compress(self, src: str, dst: str, preset: FFMPEGCompressionPreset, *, prev_pbar: Optional[tqdm] = None, cpu_utilization: float = 1.0):
+    def compress(self, src: str, dst: str, preset: Optional[FFMPEGCompressionPreset] = None, *, overwrite: bool = False, prev_pbar: Optional[tqdm] = None, utilization: float = 1.0, threads: Optional[int] = None, tune: Optional[FFMPEGTune] = None, hwaccel: str = "auto", vcodec: Optional[str] = None, stream_copy: bool = False, show_progress: bool = True, **kwargs):
         """
         Compresses a video using ffmpeg-python and displays a progress bar.
 
         :param input_path: Path to the input video file.
         :param output_path: Path to save the compressed video.
         :param preset: FFmpeg preset to balance speed and compression efficiency.
+            Defaults to `faster`, which encodes in well under half the time of
+            `medium`; pass a slower preset explicitly to trade speed for size.
+        :param tune: Optional x264 tune matching the content (film, animation, grain...).
+        :param hwaccel: "auto" to encode on a detected GPU encoder (NVENC, QSV,
+            VideoToolbox, AMF) when available, "none" to always use libx264.
+        :param vcodec: Encoder already chosen by the caller, skips the `hwaccel` detection.
+        :param stream_copy: Remux H.264 inputs into the new container instead of
+            re-encoding them. Also done for `ultrafast`, since a stream copy is both
+            faster and lossless compared to an ultrafast re-encode.
+        :param show_progress: Whether to draw a progress bar for this video.
+        """
+        if os.path.exists(dst) and not overwrite:
+            (prev_pbar.write if prev_pbar else print)(
+                f"{dst} already exists, pass --overwrite to replace it")
+            return
+        preset = preset or DEFAULT_PRESET
+        _, video_codec, _ = _probe(src)
+        if video_codec == "h264" and (stream_copy or preset == FFMPEGCompressionPreset.ULTRAFAST):
+            vcodec = "copy"
+        else:
+            vcodec = vcodec or _select_vcodec(hwaccel)
+        succeeded = self.compress_targets(src, [(dst, vcodec, 23, preset)], overwrite=overwrite, prev_pbar=prev_pbar,
+                                          utilization=utilization, threads=threads, tune=tune, show_progress=show_progress)
+        if not succeeded and vcodec in HARDWARE_ENCODERS:
+            (prev_pbar.write if prev_pbar else print)(
+                f"{vcodec} failed on {src}, retrying with libx264")
+            self.compress_targets(src, [(dst, "libx264", 23, preset)], overwrite=overwrite, prev_pbar=prev_pbar,
+                                  utilization=utilization, threads=threads, tune=tune, show_progress=show_progress)
+
+    def _command(self, src: str, targets: List[VideoTarget], *, threads: int, tune: Optional[FFMPEGTune], audio_codec: Optional[str]) -> List[str]:
+        """
+        Builds one ffmpeg command that decodes `src` once and writes every target
+        to its partial path.
+        """
+        input_kwargs = {}
+        if any(vcodec == "h264_nvenc" for _, vcodec, _, _ in targets):
+            # decode on the GPU as well
+            input_kwargs["hwaccel"] = "cuda"
+        stream = ffmpeg.input(src, **input_kwargs)
+        outputs = []
+        for dst, vcodec, crf, preset in targets:
+            audio_kwargs = dict(acodec="aac", audio_bitrate="128k")
+            if vcodec == "copy" and audio_codec == "aac":
+                audio_kwargs = dict(acodec="copy")
+            container_kwargs = {}
+            if os.path.splitext(dst)[1].lower() in FASTSTART_EXTENSIONS:
+                container_kwargs["movflags"] = "+faststart"
+            outputs.append(stream.output(
+                _partial_path(dst),
+                vcodec=vcodec,
+                **container_kwargs,
+                **audio_kwargs,
+                **_encoder_kwargs(vcodec, preset, crf, threads, tune)
+            ))
+        return (
+            ffmpeg
+            .merge_outputs(*outputs)
+            .global_args("-progress", "pipe:1", "-nostats", "-nostdin")
+            .overwrite_output()
+            .compile()
+        )
+
+    def compress_targets(self, src: str, targets: List[VideoTarget], *, overwrite: bool = False, prev_pbar: Optional[tqdm] = None, utilization: float = 1.0, threads: Optional[int] = None, tune: Optional[FFMPEGTune] = None, show_progress: bool = True) -> bool:
+        """
+        Compresses a video into several outputs with a single ffmpeg process,
+        so the input is decoded once no matter how many outputs are requested.
+
+        :param src: Path to the input video file.
+        :param targets: (dst, vcodec, crf, preset) for every output to produce,
+            a vcodec of "copy" remuxes the video stream (and AAC audio) untouched.
+            Every dst must be distinct.
+        :param overwrite: Whether to replace outputs that already exist, they are
+            skipped otherwise.
+        :param tune: Optional x264 tune applied to the libx264 outputs.
+        :param show_progress: Whether to draw a progress bar for this video.
+        :return: Whether ffmpeg produced every output.
         """
 
         log = print
         if prev_pbar:
             log = prev_pbar.write
 
+        seen: Set[str] = set()
+        for dst, *_ in targets:
+            key = os.path.normcase(os.path.abspath(dst))
+            if key in seen:
+                raise ValueError(f"duplicate target {dst!r}")
+            seen.add(key)
+        if not overwrite:
+            for dst, *_ in targets:
+                if os.path.exists(dst):
+                    log(f"{dst} already exists, pass --overwrite to replace it")
+            targets = [target for target in targets if not os.path.exists(target[0])]
+            if not targets:
+                return True
+
+        dsts = ", ".join(dst for dst, *_ in targets)
+        partials = {dst: _partial_path(dst) for dst, *_ in targets}
         try:
-            # Get video duration in seconds
-            probe = ffmpeg.probe(src)
-            duration_in_seconds = float(probe['format']['duration'])
-            filename = probe["format"]["filename"]
-            # Build FFmpeg command
-            command: List[str] = (
-                ffmpeg
-                .input(src)
-                .output(
-                    dst,
-                    vcodec="libx264",
-                    crf=23,
-                    preset=preset.value,
-                    acodec="aac",
-                    audio_bitrate="128k",
-                    threads=max(1, math.floor(os.cpu_count()*cpu_utilization))
-                )
-                .compile()
-            )
-            # Run FFmpeg with progress monitoring
+            # Get video duration in seconds, the progress bar has no total if unknown
+            duration_in_seconds, _, audio_codec = _probe(src)
+            filename = os.path.basename(src)
+            threads = min(MAX_THREADS_PER_STREAM, threads or max(
+                1, math.floor(os.cpu_count()*utilization)))
+            command = self._command(src, targets, threads=threads,
+                                    tune=tune, audio_codec=audio_codec)
+            # Run FFmpeg with progress reported as key=value lines on stdout,
+            # read as raw bytes to skip decoding lines we then throw away
             process = subprocess.Popen(
-                command, stderr=subprocess.PIPE, universal_newlines=True)
-
-            with tqdm(total=duration_in_seconds, unit="s", desc=f"Compressing {filename}", position=1 if prev_pbar else 0) as pbar:
-                for line in process.stderr:
-                    # Extract time from FFmpeg stderr
-                    match = re.search(r"time=(\d+:\d+:\d+.\d+)", line)
-                    if match:
-                        time_str = match.group(1)
-                        h, m, s = map(float, time_str.split(':'))
-                        current_time = h * 3600 + m * 60 + s
-                        pbar.n = int(current_time)
+                command, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, close_fds=False, bufsize=0)
+
+            with tqdm(total=duration_in_seconds, unit="s", desc=f"Compressing {filename}", position=1 if prev_pbar else 0, disable=not show_progress) as pbar:
+                # Read whatever is available into one reused buffer and only parse the
+                # latest complete progress line, instead of allocating every line
+                stdout_fd = process.stdout.fileno()
+                buffer = bytearray()
+                while chunk := os.read(stdout_fd, 4096):
+                    buffer += chunk
+                    current_time = _latest_progress_seconds(buffer)
+                    if current_time is not None and current_time > pbar.n:
+                        pbar.n = current_time
                         pbar.refresh()
                 process.wait()
                 if process.returncode == 0:
-                    pbar.n = pbar.total
-                    pbar.refresh()
+                    for dst, partial in partials.items():
+                        os.replace(partial, dst)
+                    if pbar.total is not None:
+                        pbar.n = pbar.total
+                        pbar.refresh()
                     log(
-                        f"Video compressed successfully and saved to: {dst}")
+                        f"Video compressed successfully and saved to: {dsts}")
+                    return True
                 else:
                     pbar.leave = False
                     cmd = " ".join(command)
@@ -278,6 +863,10 @@ class FFMPEGVideoCompressor(VideoCompressor):
         except Exception as e:
             log(f"An error occurred: {e}")
 
+        finally:
+            _remove_partials(*partials.values())
+        return False
+
 
 class Main(ObjectCompressor):
     def __init__(self):
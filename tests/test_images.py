@@ -1,4 +1,21 @@
+import io
+import os
+import tempfile
 import unittest
+from contextlib import redirect_stdout
+from unittest import mock
+
+from PIL import Image
+
+from compress import DEFAULT_PRESET, EXIF_ORIENTATION, FFMPEGImageCompressor, FileCompressor, FolderCompressor, SwitchCompressor, _has_approved_extension, _output_names, _partial_path
+
+
+class RecordingCompressor(FileCompressor):
+    def __init__(self):
+        self.calls = []
+
+    def compress(self, src, dst, preset, **kwargs):
+        self.calls.append((src, dst, preset))
 
 
 class TestImages(unittest.TestCase):
@@ -10,3 +27,147 @@ class TestImages(unittest.TestCase):
 
     def test_cr2(self):
         pass
+
+
+class TestSwitchCompressor(unittest.TestCase):
+    def test_extension_case_is_ignored(self):
+        stub = RecordingCompressor()
+        SwitchCompressor({(".jpg",): stub}).compress("X.JPG", "out.jpg", None)
+        self.assertEqual(stub.calls, [("X.JPG", "out.jpg", None)])
+
+    def test_unknown_extension_uses_default(self):
+        stub, default = RecordingCompressor(), RecordingCompressor()
+        SwitchCompressor({(".jpg",): stub}, default).compress(
+            "X.gif", "out.gif", None)
+        self.assertEqual(stub.calls, [])
+        self.assertEqual(default.calls, [("X.gif", "out.gif", None)])
+
+    def test_unknown_extension_without_default(self):
+        stub = RecordingCompressor()
+        output = io.StringIO()
+        with redirect_stdout(output):
+            SwitchCompressor({(".jpg",): stub}).compress(
+                "X.gif", "out.gif", None)
+        self.assertEqual(stub.calls, [])
+        self.assertIn("Invalid extension '.gif'", output.getvalue())
+
+
+class TestOutputNames(unittest.TestCase):
+    def test_unique_names_are_kept(self):
+        self.assertEqual(_output_names(["a.jpg", "b.cr2", "c.mp4"]),
+                         {"a.jpg": "a.jpg", "b.cr2": "b.jpg", "c.mp4": "c.mp4"})
+
+    def test_raw_and_jpeg_pair(self):
+        self.assertEqual(_output_names(["a.cr2", "a.jpg"]),
+                         {"a.jpg": "a.jpg", "a.cr2": "a.cr2.jpg"})
+
+    def test_raw_and_jpeg_pair_differing_in_case(self):
+        self.assertEqual(_output_names(["IMG_0001.CR2", "IMG_0001.JPG"]),
+                         {"IMG_0001.JPG": "IMG_0001.JPG", "IMG_0001.CR2": "IMG_0001.CR2.jpg"})
+
+    def test_case_only_collision_is_skipped(self):
+        with redirect_stdout(io.StringIO()) as output:
+            names = _output_names(["a.jpg", "a.JPG"])
+        self.assertEqual(names, {"a.jpg": "a.jpg"})
+        self.assertIn("Skipping a.JPG", output.getvalue())
+
+
+class TestJpegOrientation(unittest.TestCase):
+    def setUp(self):
+        self.folder = tempfile.TemporaryDirectory()
+        self.src = os.path.join(self.folder.name, "portrait.jpg")
+        image = Image.new("RGB", (400, 200), "red")
+        exif = image.getexif()
+        exif[EXIF_ORIENTATION] = 6  # rotate 90 degrees clockwise
+        image.save(self.src, exif=exif)
+
+    def tearDown(self):
+        self.folder.cleanup()
+
+    def _compress(self, **kwargs):
+        dst = os.path.join(self.folder.name, "out.jpg")
+        FFMPEGImageCompressor().compress(self.src, dst, DEFAULT_PRESET, **kwargs)
+        with Image.open(dst) as image:
+            return image.size
+
+    def test_recompress_applies_orientation(self):
+        self.assertEqual(self._compress(), (200, 400))
+
+    def test_downscale_applies_orientation(self):
+        self.assertEqual(self._compress(max_image_size=100), (50, 100))
+
+
+class TestOverwrite(unittest.TestCase):
+    def setUp(self):
+        self.folder = tempfile.TemporaryDirectory()
+        self.src = os.path.join(self.folder.name, "scan.tiff")
+        self.dst = os.path.join(self.folder.name, "out.tiff")
+        Image.new("RGB", (8, 8)).save(self.src)
+        with open(self.dst, "w") as f:
+            f.write("previous output")
+
+    def tearDown(self):
+        self.folder.cleanup()
+
+    def _fake_ffmpeg(self, returncode):
+        def popen(command, **kwargs):
+            partial = _partial_path(self.dst)
+            self.assertIn(partial, command)
+            with open(partial, "w") as f:
+                f.write("new output")
+            return mock.Mock(returncode=returncode)
+        return mock.patch("compress.subprocess.Popen", side_effect=popen)
+
+    def _read_dst(self):
+        with open(self.dst) as f:
+            return f.read()
+
+    def test_failed_run_keeps_previous_output(self):
+        with self._fake_ffmpeg(1), redirect_stdout(io.StringIO()):
+            FFMPEGImageCompressor().compress(self.src, self.dst, DEFAULT_PRESET, overwrite=True)
+        self.assertEqual(self._read_dst(), "previous output")
+        self.assertFalse(os.path.exists(_partial_path(self.dst)))
+
+    def test_successful_run_replaces_output(self):
+        with self._fake_ffmpeg(0):
+            FFMPEGImageCompressor().compress(self.src, self.dst, DEFAULT_PRESET, overwrite=True)
+        self.assertEqual(self._read_dst(), "new output")
+        self.assertFalse(os.path.exists(_partial_path(self.dst)))
+
+    def test_existing_output_is_skipped_without_overwrite(self):
+        with self._fake_ffmpeg(0) as popen, redirect_stdout(io.StringIO()) as output:
+            FFMPEGImageCompressor().compress(self.src, self.dst, DEFAULT_PRESET)
+        popen.assert_not_called()
+        self.assertEqual(self._read_dst(), "previous output")
+        self.assertIn("already exists", output.getvalue())
+
+    def test_clean_removes_destination(self):
+        src = os.path.join(self.folder.name, "src")
+        dst = os.path.join(self.folder.name, "dst")
+        os.makedirs(src)
+        os.makedirs(dst)
+        open(os.path.join(src, "a.jpg"), "w").close()
+        open(os.path.join(dst, "stale.jpg"), "w").close()
+        stub = RecordingCompressor()
+        with redirect_stdout(io.StringIO()):
+            FolderCompressor(stub).compress(src, dst, DEFAULT_PRESET, clean=True)
+        self.assertEqual(os.listdir(dst), [])
+        self.assertEqual([call[0] for call in stub.calls], [os.path.join(src, "a.jpg")])
+
+
+class TestApprovedExtension(unittest.TestCase):
+    def test_table(self):
+        cases = {
+            "IMG.JPG": True,
+            "photo.jpeg": True,
+            "clip.mp4": True,
+            "archive.tar.cr2": True,
+            "mp4": False,
+            "jpg": False,
+            ".jpg": False,
+            "notes.txt": False,
+            "photo.": False,
+        }
+        for name, expected in cases.items():
+            with self.subTest(name=name):
+                self.assertEqual(_has_approved_extension(name), expected)
@@ -1,4 +1,11 @@
+import io
+import os
+import tempfile
 import unittest
+from contextlib import redirect_stdout
+from unittest import mock
+
+from compress import DEFAULT_PRESET, FFMPEGCompressionPreset, FFMPEGVideoCompressor, _encoder_kwargs, _latest_progress_seconds, _parse_encoders, _partial_path, _select_vcodec
 
 
 class TestVideos(unittest.TestCase):
@@ -7,3 +14,129 @@ class TestVideos(unittest.TestCase):
 
     def test_mp4_reduce(self):
         pass
+
+
+class TestProgressParsing(unittest.TestCase):
+    def test_complete_block(self):
+        buffer = bytearray(b"frame=10\nout_time_ms=2500000\nprogress=continue\n")
+        self.assertEqual(_latest_progress_seconds(buffer), 2)
+        self.assertEqual(buffer, bytearray())
+
+    def test_latest_line_wins(self):
+        buffer = bytearray(b"out_time_ms=1000000\nout_time_ms=3000000\n")
+        self.assertEqual(_latest_progress_seconds(buffer), 3)
+
+    def test_line_split_across_chunks(self):
+        buffer = bytearray(b"frame=10\nout_time_ms=41")
+        self.assertIsNone(_latest_progress_seconds(buffer))
+        self.assertEqual(buffer, bytearray(b"out_time_ms=41"))
+        buffer += b"000000\nprogress=continue\n"
+        self.assertEqual(_latest_progress_seconds(buffer), 41)
+        self.assertEqual(buffer, bytearray())
+
+    def test_not_available(self):
+        buffer = bytearray(b"out_time_ms=N/A\nprogress=continue\n")
+        self.assertIsNone(_latest_progress_seconds(buffer))
+        self.assertEqual(buffer, bytearray())
+
+    def test_progress_end(self):
+        buffer = bytearray(
+            b"out_time_ms=9000000\nprogress=continue\n"
+            b"frame=300\nout_time_ms=10010000\nspeed=2.5x\nprogress=end\n")
+        self.assertEqual(_latest_progress_seconds(buffer), 10)
+        self.assertEqual(buffer, bytearray())
+
+    def test_no_newline_yet(self):
+        buffer = bytearray(b"out_time_ms=5000000")
+        self.assertIsNone(_latest_progress_seconds(buffer))
+        self.assertEqual(buffer, bytearray(b"out_time_ms=5000000"))
+
+
+ENCODERS_OUTPUT = """Encoders:
+ V..... = Video
+ A..... = Audio
+ S..... = Subtitle
+ .F.... = Frame-level multithreading
+ ..S... = Slice-level multithreading
+ ...X.. = Codec is experimental
+ ....B. = Supports draw_horiz_band
+ .....D = Supports direct rendering method 1
+ ------
+ V....D libx264              libx264 H.264 / AVC / MPEG-4 AVC / MPEG-4 part 10 (codec h264)
+ V....D h264_nvenc           NVIDIA NVENC H.264 encoder (codec h264)
+ A....D aac                  AAC (Advanced Audio Coding)
+ S..... srt                  SubRip subtitle
+"""
+
+
+class TestEncoderParsing(unittest.TestCase):
+    def test_encoder_rows(self):
+        self.assertEqual(_parse_encoders(ENCODERS_OUTPUT),
+                         {"libx264", "h264_nvenc", "aac", "srt"})
+
+    def test_empty_output(self):
+        self.assertEqual(_parse_encoders(""), set())
+
+
+class TestEncoderSelection(unittest.TestCase):
+    def test_unknown_hwaccel_is_rejected(self):
+        with self.assertRaises(ValueError):
+            _select_vcodec("cuda")
+
+    def test_none_uses_libx264(self):
+        self.assertEqual(_select_vcodec("none"), "libx264")
+
+    def test_nvenc_is_not_bitrate_capped(self):
+        kwargs = _encoder_kwargs("h264_nvenc", DEFAULT_PRESET, 23, 1, None)
+        self.assertEqual(kwargs["b:v"], 0)
+        self.assertEqual(kwargs["cq"], 23)
+
+    def test_qsv_preset_is_clamped(self):
+        kwargs = _encoder_kwargs(
+            "h264_qsv", FFMPEGCompressionPreset.ULTRAFAST, 23, 1, None)
+        self.assertEqual(kwargs["preset"], "veryfast")
+
+
+class TestCompressTargets(unittest.TestCase):
+    def setUp(self):
+        self.folder = tempfile.TemporaryDirectory()
+        self.src = os.path.join(self.folder.name, "in.mkv")
+        self.first = os.path.join(self.folder.name, "a.mp4")
+        self.second = os.path.join(self.folder.name, "b.mkv")
+
+    def tearDown(self):
+        self.folder.cleanup()
+
+    def test_single_decode_for_two_targets(self):
+        command = FFMPEGVideoCompressor()._command(self.src, [
+            (self.first, "libx264", 23, DEFAULT_PRESET),
+            (self.second, "libx264", 28, FFMPEGCompressionPreset.VERYFAST),
+        ], threads=2, tune=None, audio_codec="aac")
+        self.assertEqual(command.count("-i"), 1)
+        self.assertIn(_partial_path(self.first), command)
+        self.assertIn(_partial_path(self.second), command)
+
+    def test_faststart_only_for_mp4_and_mov(self):
+        compressor = FFMPEGVideoCompressor()
+        for dst, expected in [(self.first, True), (self.second, False)]:
+            with self.subTest(dst=dst):
+                command = compressor._command(self.src, [(dst, "libx264", 23, DEFAULT_PRESET)],
+                                              threads=2, tune=None, audio_codec="aac")
+                self.assertEqual("-movflags" in command, expected)
+
+    def test_duplicate_targets_are_rejected(self):
+        with self.assertRaises(ValueError):
+            FFMPEGVideoCompressor().compress_targets(self.src, [
+                (self.first, "libx264", 23, DEFAULT_PRESET),
+                (self.first, "libx264", 28, DEFAULT_PRESET),
+            ])
+
+    def test_existing_targets_are_skipped_without_overwrite(self):
+        open(self.first, "w").close()
+        open(self.second, "w").close()
+        with mock.patch("compress.subprocess.Popen") as popen, redirect_stdout(io.StringIO()):
+            FFMPEGVideoCompressor().compress_targets(self.src, [
+                (self.first, "libx264", 23, DEFAULT_PRESET),
+                (self.second, "libx264", 23, DEFAULT_PRESET),
+            ])
+        popen.assert_not_called()